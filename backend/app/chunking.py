@@ -22,10 +22,23 @@ Level 5: Agentic Chunking
     on the context.
 """
 import re
-from typing import List
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Iterator, List
 
-# Lazy import for sentence transformers (only load when needed)
-_embedding_model = None
+import numpy as np
+
+from app.embedding import get_model, encode_texts
+
+# LRU cache of sentence embeddings keyed by a digest of the sentence text
+_EMB_CACHE_SIZE = 10_000
+_EMB_CACHE: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+_EMB_CACHE_LOCK = threading.Lock()  # Uploads chunk concurrently in worker threads
+
+# Precompiled patterns shared across calls
+_HEADER_RE = re.compile(r'\n#{1,6}\s+.+\n')
+_SENT_RE = re.compile(r'(?<=[.!?])\s+')
 
 
 def chunk_document(text: str, strategy: str) -> List[str]:
@@ -46,8 +59,7 @@ def chunk_document(text: str, strategy: str) -> List[str]:
     elif strategy == 'document':
         return chunk_document_based(text)
     elif strategy == 'semantic':
-        # Placeholder for semantic chunking
-        return [text]
+        return chunk_semantic(text)
     elif strategy == 'agentic':
         # Placeholder for agentic chunking
         return [text]
@@ -55,6 +67,26 @@ def chunk_document(text: str, strategy: str) -> List[str]:
         return [text]
 
 
+def chunk_document_iter(text: str, strategy: str) -> Iterator[str]:
+    """
+    Lazily chunk document based on selected strategy
+    
+    Fixed-size chunks are produced one at a time instead of being buffered;
+    other strategies need the whole split before emitting chunks.
+    
+    Args:
+        text: The document text to chunk
+        strategy: The chunking strategy to use
+        
+    Yields:
+        Text chunks
+    """
+    if strategy == 'fixed':
+        yield from chunk_fixed_size_iter(text, chunk_size=1000, overlap=200)
+    else:
+        yield from chunk_document(text, strategy)
+
+
 def chunk_fixed_size(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
     """
     Split text into fixed-size chunks with overlap
@@ -67,13 +99,26 @@ def chunk_fixed_size(text: str, chunk_size: int = 1000, overlap: int = 200) -> L
     Returns:
         List of text chunks
     """
-    chunks = []
-    i = 0
-    while i < len(text):
-        end = i + chunk_size
-        chunks.append(text[i:end])
-        i += chunk_size - overlap
-    return [chunk for chunk in chunks if chunk.strip()]
+    return list(chunk_fixed_size_iter(text, chunk_size, overlap))
+
+
+def chunk_fixed_size_iter(text: str, chunk_size: int = 1000, overlap: int = 200) -> Iterator[str]:
+    """
+    Generate fixed-size chunks with overlap, one at a time
+    
+    Args:
+        text: The text to chunk
+        chunk_size: Size of each chunk in characters
+        overlap: Number of overlapping characters between chunks
+        
+    Yields:
+        Text chunks (whitespace-only windows are skipped)
+    """
+    step = chunk_size - overlap
+    for i in range(0, len(text), step):
+        chunk = text[i:i + chunk_size]
+        if chunk and not chunk.isspace():
+            yield chunk
 
 
 def chunk_recursive(text: str, max_chunk_size: int = 1000) -> List[str]:
@@ -104,33 +149,41 @@ def chunk_recursive(text: str, max_chunk_size: int = 1000) -> List[str]:
         
         # Split by current separator
         splits = text.split(separator)
+        sep_len = len(separator)
         chunks = []
-        current_chunk = ""
+        current_chunk_parts = []
+        cur_len = 0
+        
+        def flush():
+            """Emit the accumulated parts, recursing if they are still too large"""
+            chunk_text = separator.join(current_chunk_parts)
+            if cur_len > max_chunk_size:
+                chunks.extend(recursive_split(chunk_text, remaining_separators))
+            else:
+                chunk_text = chunk_text.strip()
+                if chunk_text:
+                    chunks.append(chunk_text)
         
         for split in splits:
+            split_len = len(split)
             # If adding this split exceeds max size, save current chunk and start new one
-            if current_chunk and len(current_chunk) + len(separator) + len(split) > max_chunk_size:
-                # If current chunk is still too large, recursively split it
-                if len(current_chunk) > max_chunk_size:
-                    chunks.extend(recursive_split(current_chunk, remaining_separators))
-                else:
-                    chunks.append(current_chunk.strip())
-                current_chunk = split
-            else:
+            if cur_len and cur_len + sep_len + split_len > max_chunk_size:
+                flush()
+                current_chunk_parts = [split]
+                cur_len = split_len
+            elif cur_len:
                 # Add to current chunk
-                if current_chunk:
-                    current_chunk += separator + split
-                else:
-                    current_chunk = split
+                current_chunk_parts.append(split)
+                cur_len += sep_len + split_len
+            else:
+                current_chunk_parts = [split]
+                cur_len = split_len
         
         # Handle remaining chunk
-        if current_chunk:
-            if len(current_chunk) > max_chunk_size:
-                chunks.extend(recursive_split(current_chunk, remaining_separators))
-            else:
-                chunks.append(current_chunk.strip())
+        if cur_len:
+            flush()
         
-        return [c for c in chunks if c.strip()]
+        return chunks
     
     return recursive_split(text, separators)
 
@@ -159,26 +212,13 @@ def chunk_document_based(text: str, delimiter: str = '---') -> List[str]:
         chunks = [chunk.strip() for chunk in text.split(delimiter) if chunk.strip()]
         return chunks
     
-    # Try to detect markdown headers or section breaks
-    header_pattern = r'\n#{1,6}\s+.+\n'
-    if re.search(header_pattern, text):
-        # Split by headers while keeping the header with its content
-        parts = re.split(r'(\n#{1,6}\s+.+\n)', text)
-        chunks = []
-        current_chunk = ""
-        
-        for i, part in enumerate(parts):
-            if re.match(r'\n#{1,6}\s+.+\n', part):
-                # This is a header
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = part
-            else:
-                current_chunk += part
-        
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-        
+    # Try to detect markdown headers or section breaks in a single pass;
+    # each section runs from one header to the next
+    header_starts = [match.start() for match in _HEADER_RE.finditer(text)]
+    if header_starts:
+        # Keep each header with its content
+        boundaries = [0] + header_starts + [len(text)]
+        chunks = [text[start:end].strip() for start, end in zip(boundaries, boundaries[1:])]
         return [c for c in chunks if c]
     
     # Fallback to paragraph-based splitting
@@ -219,15 +259,8 @@ def chunk_semantic(
         List of text chunks
     """
     try:
-        from sentence_transformers import SentenceTransformer
-        from sklearn.metrics.pairwise import cosine_similarity
-        
-        # Load model (cached after first use)
-        global _embedding_model
-        if _embedding_model is None:
-            # Using all-MiniLM-L6-v2: Fast, lightweight, and effective
-            # 384 dimensions, 22M parameters
-            _embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Load shared model (cached after first use)
+        get_model()
         
         # Split into sentences
         sentences = _split_into_sentences(text)
@@ -236,23 +269,18 @@ def chunk_semantic(
             return [text]
         
         # Generate embeddings for all sentences
-        embeddings = _embedding_model.encode(sentences)
+        embeddings = _encode_cached(sentences)
         
         # Calculate cosine similarity between consecutive sentences
-        similarities = []
-        for i in range(len(embeddings) - 1):
-            sim = cosine_similarity(
-                embeddings[i].reshape(1, -1),
-                embeddings[i + 1].reshape(1, -1)
-            )[0][0]
-            similarities.append(sim)
+        # (embeddings are unit-normalized, so this is a row-wise dot product)
+        similarities = np.einsum('ij,ij->i', embeddings[:-1], embeddings[1:])
         
         # Group sentences into chunks based on similarity
         chunks = []
         current_chunk = [sentences[0]]
         current_size = len(sentences[0])
         
-        for i, (sentence, similarity) in enumerate(zip(sentences[1:], similarities)):
+        for sentence, similarity in zip(sentences[1:], similarities):
             sentence_len = len(sentence)
             
             # Check if we should start a new chunk
@@ -287,6 +315,49 @@ def chunk_semantic(
         return chunk_recursive(text)
 
 
+def _encode_cached(sentences: List[str]) -> np.ndarray:
+    """
+    Encode sentences, reusing embeddings of sentences seen before
+    
+    Only cache misses are sent to the model, sorted by length to minimize
+    padding; hits are served from an LRU keyed by a BLAKE2b digest of the
+    sentence text.
+    Embeddings are L2-normalized by the model, so cosine similarity between
+    rows is a plain dot product.
+    
+    Args:
+        sentences: Sentences to encode
+        
+    Returns:
+        Embedding matrix with one row per sentence, in input order
+    """
+    keys = [hashlib.blake2b(s.encode(), digest_size=16).digest() for s in sentences]
+    
+    rows = {}
+    misses = {}
+    with _EMB_CACHE_LOCK:
+        for key, sentence in zip(keys, sentences):
+            embedding = _EMB_CACHE.get(key)
+            if embedding is not None:
+                _EMB_CACHE.move_to_end(key)
+                rows[key] = embedding
+            elif key not in misses:
+                misses[key] = sentence
+    
+    if misses:
+        # Encode outside the lock; other uploads can still hit the cache
+        encoded = encode_texts(list(misses.values()))
+        with _EMB_CACHE_LOCK:
+            for key, embedding in zip(misses, encoded):
+                # Copy so a cached row doesn't keep the whole batch matrix alive
+                rows[key] = embedding
+                _EMB_CACHE[key] = embedding.copy()
+            while len(_EMB_CACHE) > _EMB_CACHE_SIZE:
+                _EMB_CACHE.popitem(last=False)
+    
+    return np.stack([rows[key] for key in keys])
+
+
 def _split_into_sentences(text: str) -> List[str]:
     """
     Split text into sentences using regex
@@ -298,8 +369,7 @@ def _split_into_sentences(text: str) -> List[str]:
         List of sentences
     """
     # Split on sentence boundaries (., !, ?)
-    sentence_pattern = r'(?<=[.!?])\s+'
-    sentences = re.split(sentence_pattern, text)
+    sentences = _SENT_RE.split(text)
     
     # Clean and filter
     sentences = [s.strip() for s in sentences if s.strip()]
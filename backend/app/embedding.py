@@ -0,0 +1,183 @@
+"""
+Shared embedding model for chunking and retrieval
+
+Both semantic chunking and semantic/hybrid retrieval use the same
+'all-MiniLM-L6-v2' model from Hugging Face (sentence-transformers). It is
+loaded once, on first use, and shared so only one copy lives in memory.
+
+On CPU the model runs through ONNX Runtime with an int8-quantized export
+shipped in the model repository, which is several times faster than the
+PyTorch graph. The export is chosen for the host CPU (AVX-512 VNNI, AVX2
+or arm64). Set EMBEDDING_BACKEND=torch to use PyTorch instead.
+"""
+import os
+import platform
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Quantized ONNX exports in the model repository, per CPU family
+ONNX_FILE_AVX512_VNNI = 'onnx/model_qint8_avx512_vnni.onnx'
+ONNX_FILE_AVX2 = 'onnx/model_quint8_avx2.onnx'
+ONNX_FILE_ARM64 = 'onnx/model_qint8_arm64.onnx'
+ONNX_FILE_UNQUANTIZED = 'onnx/model.onnx'
+
+# Encoding batch sizes per device
+CPU_BATCH_SIZE = 64
+GPU_BATCH_SIZE = 256
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """
+    Get the shared sentence-transformers model, loading it on first use
+
+    The model is placed on CUDA when available. On CPU, the quantized ONNX
+    export is tried first and PyTorch is used if it cannot be loaded
+    (e.g. optimum/onnxruntime not installed).
+
+    Returns:
+        The loaded SentenceTransformer instance
+
+    Raises:
+        ImportError: If sentence-transformers is not installed
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                import torch
+
+                # all-MiniLM-L6-v2: Fast, lightweight, and effective
+                # 384 dimensions, 22M parameters
+                device = 'cuda' if torch.cuda.is_available() else 'cpu'
+                if device == 'cpu' and os.getenv('EMBEDDING_BACKEND', 'onnx') == 'onnx':
+                    _model = _load_onnx_model(SentenceTransformer)
+                if _model is None:
+                    _model = SentenceTransformer(MODEL_NAME, device=device)
+    return _model
+
+
+def is_model_loaded() -> bool:
+    """Whether the shared model has been loaded, without triggering a load"""
+    return _model is not None
+
+
+def _default_onnx_file() -> str:
+    """
+    Pick the ONNX export matching the host CPU
+
+    The AVX-512 VNNI export is only used where the CPU reports VNNI; other
+    x86 hosts get the portable AVX2 export and arm64 hosts the arm64 one.
+
+    Returns:
+        Path of the export inside the model repository
+    """
+    machine = platform.machine().lower()
+    if machine in ('arm64', 'aarch64'):
+        return ONNX_FILE_ARM64
+    if machine not in ('x86_64', 'amd64', 'i386', 'i686', 'x86'):
+        return ONNX_FILE_UNQUANTIZED
+    if 'avx512_vnni' in _cpu_flags():
+        return ONNX_FILE_AVX512_VNNI
+    return ONNX_FILE_AVX2
+
+
+def _cpu_flags() -> set:
+    """CPU feature flags from /proc/cpuinfo, or an empty set where unavailable"""
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith('flags'):
+                    return set(line.split(':', 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def _load_onnx_model(model_class):
+    """Load the quantized ONNX export on CPU, or return None if unavailable"""
+    file_name = os.getenv('EMBEDDING_ONNX_FILE') or _default_onnx_file()
+    try:
+        return model_class(
+            MODEL_NAME,
+            device='cpu',
+            backend='onnx',
+            model_kwargs={'file_name': file_name}
+        )
+    except Exception as e:
+        print(f"Warning: Could not load ONNX embedding model ({e}). Falling back to PyTorch.")
+        return None
+
+
+def encode_texts(texts, convert_to_tensor: bool = False):
+    """
+    Encode texts as unit-norm embeddings, smart-batched by length
+
+    Texts are encoded in length order so each batch pads to similar lengths,
+    then the rows are put back in input order.
+
+    Args:
+        texts: List of texts to encode
+        convert_to_tensor: Return a torch tensor left on the model's device
+            instead of a NumPy array
+
+    Returns:
+        Embedding matrix with one row per text, in input order
+
+    Raises:
+        ImportError: If sentence-transformers is not installed
+    """
+    model = get_model()
+    order = np.argsort([len(text) for text in texts], kind='stable')
+    on_gpu = model.device.type == 'cuda'
+    encoded_sorted = model.encode(
+        [texts[i] for i in order],
+        batch_size=GPU_BATCH_SIZE if on_gpu else CPU_BATCH_SIZE,
+        normalize_embeddings=True,
+        convert_to_numpy=not convert_to_tensor,
+        convert_to_tensor=convert_to_tensor,
+        show_progress_bar=False
+    )
+    if convert_to_tensor:
+        import torch
+        encoded = torch.empty_like(encoded_sorted)
+        encoded[torch.as_tensor(order, device=encoded.device)] = encoded_sorted
+        return encoded
+    encoded = np.empty_like(encoded_sorted)
+    encoded[order] = encoded_sorted
+    return encoded
+
+
+def encode_query(query: str):
+    """
+    Get the normalized embedding of a query, cached for repeated queries
+
+    The returned array is shared between callers and is read-only.
+
+    Args:
+        query: Query text
+
+    Returns:
+        Unit-norm embedding vector
+
+    Raises:
+        ImportError: If sentence-transformers is not installed
+    """
+    return _encode_query(query, MODEL_NAME)
+
+
+@lru_cache(maxsize=1024)
+def _encode_query(query: str, model_name: str):
+    """Encode a single query; cached per (query, model name)"""
+    embedding = get_model().encode(
+        [query], normalize_embeddings=True, show_progress_bar=False
+    )[0]
+    embedding.setflags(write=False)
+    return embedding
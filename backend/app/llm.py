@@ -2,10 +2,86 @@
 LLM integration for response generation
 """
 import os
+import asyncio
+import hashlib
+
+import numpy as np
 from dotenv import load_dotenv
 
+from app.embedding import encode_query, is_model_loaded
+
 load_dotenv()
 
+# Semantic response cache: (query embedding, context hash, response), oldest first.
+# A query close enough to a cached one on the same context and conversation
+# history reuses its answer.
+_RESPONSE_CACHE_SIZE = 256
+_RESPONSE_CACHE_THRESHOLD = 0.87
+_response_cache = []
+
+# Gemini model wrapper, configured once on first use
+_gemini_model = None
+
+
+def _get_gemini_model(api_key: str):
+    """
+    Get the Gemini model wrapper, configuring the client on first use
+    
+    Args:
+        api_key: Gemini API key used to configure the client
+        
+    Raises:
+        ImportError: If google-generativeai is not installed
+    """
+    global _gemini_model
+    if _gemini_model is None:
+        import google.generativeai as genai
+        
+        genai.configure(api_key=api_key)
+        _gemini_model = genai.GenerativeModel('gemini-2.5-flash')
+    return _gemini_model
+
+
+def _embed_query(query: str):
+    """Embed the query for cache lookups with the loaded model, or return None on failure"""
+    try:
+        return encode_query(query)
+    except Exception:
+        return None
+
+
+def _lookup_cached_response(query_embedding, ctx_hash: str):
+    """
+    Find a cached response for a semantically similar query on the same context
+    
+    Args:
+        query_embedding: Normalized query embedding
+        ctx_hash: Hash of the retrieved context and conversation history
+        
+    Returns:
+        The cached response, or None on a miss
+    """
+    candidates = [i for i, entry in enumerate(_response_cache) if entry[1] == ctx_hash]
+    if not candidates:
+        return None
+    
+    similarities = np.stack([_response_cache[i][0] for i in candidates]) @ query_embedding
+    best = int(np.argmax(similarities))
+    if similarities[best] < _RESPONSE_CACHE_THRESHOLD:
+        return None
+    
+    # Move the hit to the back so eviction stays least-recently-used
+    entry = _response_cache.pop(candidates[best])
+    _response_cache.append(entry)
+    return entry[2]
+
+
+def _store_cached_response(query_embedding, ctx_hash: str, response: str):
+    """Add a response to the cache, evicting the least recently used entry"""
+    _response_cache.append((query_embedding, ctx_hash, response))
+    if len(_response_cache) > _RESPONSE_CACHE_SIZE:
+        _response_cache.pop(0)
+
 
 async def generate_response(context: str, query: str, conversation_history: list = None) -> str:
     """
@@ -14,7 +90,7 @@ async def generate_response(context: str, query: str, conversation_history: list
     Args:
         context: Retrieved context from document chunks
         query: User query
-        conversation_history: List of previous messages [{"role": "user/assistant", "content": "..."}]
+        conversation_history: List (or deque) of previous messages [{"role": "user/assistant", "content": "..."}]
         
     Returns:
         Generated response text
@@ -32,10 +108,27 @@ async def generate_response(context: str, query: str, conversation_history: list
     # Build conversation history
     history_text = ""
     if conversation_history:
-        history_text = "\n\nPrevious Conversation:\n"
-        for msg in conversation_history[-6:]:  # Last 3 exchanges (6 messages)
+        history_parts = ["\n\nPrevious Conversation:\n"]
+        for msg in list(conversation_history)[-6:]:  # Last 3 exchanges (6 messages)
             role = "User" if msg["role"] == "user" else "Assistant"
-            history_text += f"{role}: {msg['content']}\n"
+            history_parts.append(f"{role}: {msg['content']}\n")
+        history_text = "".join(history_parts)
+    
+    # Reuse the answer to a near-duplicate question on the same context; the
+    # history is part of the key, since follow-ups depend on it
+    digest = hashlib.blake2b(context.encode())
+    digest.update(b'\0')
+    digest.update(history_text.encode())
+    ctx_hash = digest.hexdigest()
+    # Only use the cache once retrieval/chunking has loaded the embedding
+    # model; answering a query should never trigger a model load
+    query_embedding = None
+    if is_model_loaded():
+        query_embedding = await asyncio.to_thread(_embed_query, query)
+    if query_embedding is not None:
+        cached = _lookup_cached_response(query_embedding, ctx_hash)
+        if cached is not None:
+            return cached
     
     # Construct the improved prompt
     prompt = f"""You are a concise teaching assistant helping students understand lecture materials.
@@ -58,12 +151,13 @@ Question: {query}
 Provide a concise, plain-text answer (no markdown):"""
     
     try:
-        import google.generativeai as genai
+        model = _get_gemini_model(api_key)
         
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        # Run the blocking SDK call off the event loop
+        response = await asyncio.to_thread(model.generate_content, prompt)
         
-        response = model.generate_content(prompt)
+        if query_embedding is not None:
+            _store_cached_response(query_embedding, ctx_hash, response.text)
         return response.text
         
     except ImportError:
@@ -1,10 +1,19 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import os
+import uuid
+import asyncio
+import hashlib
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
 from app.chunking import chunk_document
-from app.retrieval import retrieve_chunks
+from app.embedding import get_model, MODEL_NAME
+from app.retrieval import retrieve_chunks, precompute_chunk_embeddings
 from app.llm import generate_response
 from app.utils import extract_text_from_pdf
 
@@ -28,14 +37,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory document store (use database in production)
-document_store = {
-    'text': '',
-    'chunks': [],
-    'chunking_strategy': '',
-    'retrieval_strategy': '',
-    'conversation_history': []  # Store conversation for context
-}
+@dataclass
+class DocStore:
+    """In-memory document store (use database in production)"""
+    text: str = ''
+    chunks: list = field(default_factory=list)
+    chunking_strategy: str = ''
+    retrieval_strategy: str = ''
+    # Store conversation for context (last 10 exchanges)
+    conversation_history: deque = field(default_factory=lambda: deque(maxlen=20))
+    status: str = 'ready'  # 'processing' while a background upload is running
+    job_id: Optional[str] = None  # Id of the latest background upload
+    error: Optional[str] = None  # Error from the latest background upload, if it failed
+    doc_key: Optional[tuple] = None  # (text hash, chunking strategy) the chunks were built from
+    embedding_key: Optional[tuple] = None  # (doc_key, model name) of the pre-computed chunk embeddings
+
+
+document_store = DocStore()
 
 
 class DocumentUpload(BaseModel):
@@ -49,41 +67,74 @@ class Query(BaseModel):
     conversation_history: list = []  # Optional conversation history from frontend
 
 
+def _preload_embedding_model():
+    """Load the shared embedding model, logging instead of raising on failure"""
+    try:
+        get_model()
+    except Exception as e:
+        print(f"Warning: Could not preload embedding model: {e}")
+
+
+@app.on_event("startup")
+async def warm_embedding_model():
+    """Start loading the embedding model in the background at startup"""
+    # Set PRELOAD_EMBEDDING_MODEL=0 to keep loading it lazily on first use
+    if os.getenv('PRELOAD_EMBEDDING_MODEL', '1') != '1':
+        return
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(None, _preload_embedding_model)
+
+
 @app.get("/")
 async def root():
     return {"message": "RAG Strategy Comparator API", "status": "running"}
 
 
+def _store_chunks(chunks, doc_key=None):
+    """Replace the stored chunks and everything derived from them"""
+    document_store.chunks = chunks
+    document_store.doc_key = doc_key
+    document_store.embedding_key = None
+
+
 @app.post("/api/upload")
 async def upload_document(data: DocumentUpload):
     """Handle document upload and chunking"""
     if not data.document_text:
         raise HTTPException(status_code=400, detail="No document text provided")
     
-    # Store document and strategies
-    document_store['text'] = data.document_text
-    document_store['chunking_strategy'] = data.chunking_strategy
-    document_store['retrieval_strategy'] = data.retrieval_strategy
+    # Store document and strategies (supersedes any pending background upload)
+    document_store.status = 'ready'
+    document_store.job_id = None
+    document_store.error = None
+    document_store.text = data.document_text
+    document_store.chunking_strategy = data.chunking_strategy
+    document_store.retrieval_strategy = data.retrieval_strategy
     
-    # Chunk the document
-    chunks = chunk_document(data.document_text, data.chunking_strategy)
-    document_store['chunks'] = chunks
+    # Chunk the document (CPU-bound, so keep it off the event loop),
+    # reusing the existing chunks when the same text is re-uploaded
+    doc_key = (
+        hashlib.blake2b(data.document_text.encode()).hexdigest(),
+        data.chunking_strategy
+    )
+    if doc_key == document_store.doc_key:
+        chunks = document_store.chunks
+    else:
+        chunks = await asyncio.to_thread(
+            chunk_document, data.document_text, data.chunking_strategy
+        )
+        _store_chunks(chunks, doc_key)
     
     # Clear conversation history when new document is uploaded
-    document_store['conversation_history'] = []
+    document_store.conversation_history.clear()
     
     # Pre-generate embeddings for semantic/hybrid retrieval to speed up queries
-    if data.retrieval_strategy in ['semantic', 'hybrid']:
-        from app.retrieval import _embedding_model
+    embedding_key = (doc_key, MODEL_NAME)
+    if data.retrieval_strategy in ['semantic', 'hybrid'] and embedding_key != document_store.embedding_key:
         try:
-            from sentence_transformers import SentenceTransformer
-            if _embedding_model is None:
-                # Load model once
-                import app.retrieval as retrieval_module
-                retrieval_module._embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-            # Pre-compute chunk embeddings
-            import app.retrieval as retrieval_module
-            retrieval_module._chunk_embeddings = retrieval_module._embedding_model.encode(chunks)
+            # Pre-compute chunk embeddings with the shared model
+            await asyncio.to_thread(precompute_chunk_embeddings, chunks)
+            document_store.embedding_key = embedding_key
         except Exception as e:
             print(f"Warning: Could not pre-compute embeddings: {e}")
             pass  # Fallback to computing on query
@@ -95,34 +146,98 @@ async def upload_document(data: DocumentUpload):
     }
 
 
+def _extract_file_text(filename: str, content: bytes) -> str:
+    """Extract text from an uploaded .txt or .pdf file"""
+    if filename.endswith('.pdf'):
+        return extract_text_from_pdf(content)
+    return content.decode('utf-8')
+
+
+def _process_file_upload(
+    job_id: str,
+    filename: str,
+    content: bytes,
+    chunking_strategy: str,
+    retrieval_strategy: str
+):
+    """Extract and chunk an uploaded file as a background task"""
+    try:
+        document_text = _extract_file_text(filename, content)
+        chunks = chunk_document(document_text, chunking_strategy)
+    except Exception as e:
+        if document_store.job_id == job_id:
+            document_store.status = 'error'
+            document_store.error = str(e)
+        return
+    
+    # A newer upload replaced this one while it was processing
+    if document_store.job_id != job_id:
+        return
+    
+    document_store.text = document_text
+    document_store.chunking_strategy = chunking_strategy
+    document_store.retrieval_strategy = retrieval_strategy
+    _store_chunks(chunks)
+    document_store.status = 'ready'
+
+
 @app.post("/api/upload-file")
 async def upload_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     chunking_strategy: str = "fixed",
-    retrieval_strategy: str = "top-k"
+    retrieval_strategy: str = "top-k",
+    background: bool = False
 ):
-    """Handle file upload (txt or pdf)"""
+    """
+    Handle file upload (txt or pdf)
+    
+    With background=true the file is extracted and chunked after the response
+    is sent; poll /api/status until its status is no longer 'processing'.
+    """
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
-    # Extract text based on file type
-    if file.filename.endswith('.txt'):
-        content = await file.read()
-        document_text = content.decode('utf-8')
-    elif file.filename.endswith('.pdf'):
-        content = await file.read()
-        document_text = extract_text_from_pdf(content)
-    else:
+    if not file.filename.endswith(('.txt', '.pdf')):
         raise HTTPException(status_code=400, detail="Unsupported file type. Please upload .txt or .pdf")
     
-    # Store document and strategies
-    document_store['text'] = document_text
-    document_store['chunking_strategy'] = chunking_strategy
-    document_store['retrieval_strategy'] = retrieval_strategy
+    content = await file.read()
+    
+    if background:
+        job_id = uuid.uuid4().hex
+        document_store.job_id = job_id
+        document_store.status = 'processing'
+        document_store.error = None
+        background_tasks.add_task(
+            _process_file_upload,
+            job_id,
+            file.filename,
+            content,
+            chunking_strategy,
+            retrieval_strategy
+        )
+        return {
+            "message": "File accepted for processing",
+            "filename": file.filename,
+            "job_id": job_id,
+            "status": "processing",
+            "chunking_strategy": chunking_strategy
+        }
     
-    # Chunk the document
-    chunks = chunk_document(document_text, chunking_strategy)
-    document_store['chunks'] = chunks
+    # Extract text based on file type (CPU-bound for PDFs)
+    document_text = await asyncio.to_thread(_extract_file_text, file.filename, content)
+    
+    # Store document and strategies (supersedes any pending background upload)
+    document_store.status = 'ready'
+    document_store.job_id = None
+    document_store.error = None
+    document_store.text = document_text
+    document_store.chunking_strategy = chunking_strategy
+    document_store.retrieval_strategy = retrieval_strategy
+    
+    # Chunk the document (CPU-bound, so keep it off the event loop)
+    chunks = await asyncio.to_thread(chunk_document, document_text, chunking_strategy)
+    _store_chunks(chunks)
     
     return {
         "message": "File uploaded successfully",
@@ -138,33 +253,35 @@ async def query_document(data: Query):
     if not data.query:
         raise HTTPException(status_code=400, detail="No query provided")
     
-    if not document_store['chunks']:
+    if document_store.status == 'processing':
+        raise HTTPException(status_code=409, detail="Document is still being processed. Please try again shortly.")
+    
+    if not document_store.chunks:
         raise HTTPException(status_code=400, detail="No document uploaded. Please upload a document first.")
     
     # Retrieve relevant chunks
     context = retrieve_chunks(
-        document_store['chunks'],
+        document_store.chunks,
         data.query,
-        document_store['retrieval_strategy']
+        document_store.retrieval_strategy
     )
     
     # Use conversation history from request or stored history
-    conversation_history = data.conversation_history if data.conversation_history else document_store.get('conversation_history', [])
+    conversation_history = data.conversation_history if data.conversation_history else document_store.conversation_history
     
     # Generate response using Gemini API with conversation context
     response = await generate_response(context, data.query, conversation_history)
     
-    # Store this exchange in conversation history (keep last 10 exchanges)
-    document_store['conversation_history'].append({"role": "user", "content": data.query})
-    document_store['conversation_history'].append({"role": "assistant", "content": response})
-    document_store['conversation_history'] = document_store['conversation_history'][-20:]  # Keep last 10 exchanges
+    # Store this exchange in conversation history (bounded to the last 10 exchanges)
+    document_store.conversation_history.append({"role": "user", "content": data.query})
+    document_store.conversation_history.append({"role": "assistant", "content": response})
     
     return {
         "response": response,
         "context": context,
-        "num_chunks_retrieved": len(context.split('\n---\n')) if context else 0,
-        "chunking_strategy": document_store['chunking_strategy'],
-        "retrieval_strategy": document_store['retrieval_strategy']
+        "num_chunks_retrieved": (context.count('\n---\n') + 1) if context else 0,
+        "chunking_strategy": document_store.chunking_strategy,
+        "retrieval_strategy": document_store.retrieval_strategy
     }
 
 
@@ -172,8 +289,11 @@ async def query_document(data: Query):
 async def get_status():
     """Get current document status"""
     return {
-        "document_loaded": bool(document_store['text']),
-        "num_chunks": len(document_store['chunks']),
-        "chunking_strategy": document_store['chunking_strategy'],
-        "retrieval_strategy": document_store['retrieval_strategy']
+        "document_loaded": bool(document_store.text),
+        "num_chunks": len(document_store.chunks),
+        "chunking_strategy": document_store.chunking_strategy,
+        "retrieval_strategy": document_store.retrieval_strategy,
+        "status": document_store.status,
+        "job_id": document_store.job_id,
+        "error": document_store.error
     }
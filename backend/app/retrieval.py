@@ -7,13 +7,38 @@ Retrieval strategies for finding relevant chunks
 4. MMR: Maximal Marginal Relevance for diversity
 5. Parent Document: Retrieves with expanded context
 """
+import hashlib
 from typing import List
 import numpy as np
 
-# Lazy imports for heavy dependencies
-_embedding_model = None
-_bm25_index = None
+from app.embedding import get_model, encode_query, encode_texts
+
+try:
+    # Optional SIMD cosine kernels (AVX2/AVX-512/NEON); NumPy is used otherwise
+    import simsimd
+except ImportError:
+    simsimd = None
+
+# Chunk embeddings are published as one tuple, so a query running while an
+# upload re-encodes never mixes two documents:
+#   (content hash of the chunks, float32 rows, int8 rows or None)
+# Invariant: the float rows are unit-norm, and on CPU the array is
+# C-contiguous float32 (a torch tensor on CUDA), so every consumer can use
+# plain dot products on it. The int8 rows are only kept for SimSIMD.
 _chunk_embeddings = None
+_term_key = None  # Content hash of the chunks the term matrices below were built from
+_term_vectorizer = None  # Whitespace-token CountVectorizer fitted on the chunks
+_chunk_term_matrix = None  # Binary chunk x term CSR matrix (int32 term IDs per row)
+_chunk_bm25_matrix = None  # Per-(chunk, term) BM25 weights, sharing the term IDs above
+_chunk_bitsets = None  # Packed uint64 word bitsets per chunk (small vocabularies only)
+
+# Largest vocabulary for which word overlaps are computed by popcount
+_BITSET_MAX_VOCAB = 4096
+
+# BM25 (Okapi) parameters, as in rank_bm25's defaults
+_BM25_K1 = 1.5
+_BM25_B = 0.75
+_BM25_EPSILON = 0.25
 
 
 def retrieve_chunks(chunks: List[str], query: str, strategy: str, k: int = 3) -> str:
@@ -29,18 +54,329 @@ def retrieve_chunks(chunks: List[str], query: str, strategy: str, k: int = 3) ->
     Returns:
         Combined context string from retrieved chunks
     """
-    if strategy == 'top-k':
-        return retrieve_top_k(chunks, query, k)
-    elif strategy == 'semantic':
-        return retrieve_semantic(chunks, query, k)
-    elif strategy == 'hybrid':
-        return retrieve_hybrid(chunks, query, k)
-    elif strategy == 'mmr':
-        return retrieve_mmr(chunks, query, k)
-    elif strategy == 'parent':
-        return retrieve_parent_document(chunks, query, k)
+    return _STRATEGIES.get(strategy, retrieve_top_k)(chunks, query, k)
+
+
+def precompute_chunk_embeddings(chunks: List[str]):
+    """
+    Encode and cache chunk embeddings ahead of the first semantic/hybrid query
+    
+    Args:
+        chunks: List of document chunks
+    """
+    _set_chunk_embeddings(_encode_chunks(chunks), _chunks_key(chunks))
+
+
+def _chunks_key(chunks: List[str]) -> bytes:
+    """
+    Content hash of a chunk list, used to key the embedding and term caches
+    
+    Each chunk is length-prefixed so different splits of the same text
+    (e.g. ['a\\nb'] and ['a', 'b']) never hash alike.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in chunks:
+        data = chunk.encode()
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.digest()
+
+
+def _encode_chunks(chunks: List[str]):
+    """Encode chunks (smart-batched by length) as L2-normalized, C-contiguous float32 rows"""
+    if get_model().device.type == 'cuda':
+        # Keep the rows on the GPU so scoring needs no host round trip
+        return encode_texts(chunks, convert_to_tensor=True)
+    embeddings = np.ascontiguousarray(encode_texts(chunks), dtype=np.float32)
+    
+    # Re-normalize once here so the unit-norm invariant holds whatever the
+    # backend returned (zero rows stay zero instead of becoming NaN)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings /= np.clip(norms, 1e-12, None)
+    return embeddings
+
+
+def _quantize_i8(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Quantize rows to int8, scaling each row so its largest component is 127
+    
+    Cosine similarity ignores per-row scale, so the scales are not kept.
+    """
+    peaks = np.max(np.abs(embeddings), axis=1, keepdims=True)
+    scaled = embeddings * (127.0 / np.maximum(peaks, 1e-12))
+    return np.ascontiguousarray(np.rint(scaled), dtype=np.int8)
+
+
+def _set_chunk_embeddings(embeddings, key: bytes) -> tuple:
+    """Cache chunk embeddings, plus their int8 form when SimSIMD can use it"""
+    global _chunk_embeddings
+    if simsimd is not None and isinstance(embeddings, np.ndarray):
+        embeddings_i8 = _quantize_i8(embeddings)
     else:
-        return retrieve_top_k(chunks, query, k)
+        embeddings_i8 = None
+    
+    # Publish everything in one assignment, after the int8 copy exists
+    entry = (key, embeddings, embeddings_i8)
+    _chunk_embeddings = entry
+    return entry
+
+
+def _on_gpu(embeddings) -> bool:
+    """Whether chunk embeddings are a GPU tensor rather than a NumPy array"""
+    return not isinstance(embeddings, np.ndarray)
+
+
+def _ensure_chunk_embeddings(chunks: List[str]) -> tuple:
+    """
+    Get the embeddings of these exact chunks, encoding them if not cached
+    
+    Args:
+        chunks: List of document chunks
+        
+    Returns:
+        Tuple of (float32 rows, int8 rows or None), from a single cache entry
+    """
+    key = _chunks_key(chunks)
+    cached = _chunk_embeddings
+    if cached is None or cached[0] != key:
+        cached = _set_chunk_embeddings(_encode_chunks(chunks), key)
+    return cached[1], cached[2]
+
+
+def _ensure_term_matrix(chunks: List[str]):
+    """
+    Build the chunk-term matrices (binary and BM25) once per chunk list
+    
+    Chunks are tokenized once; the vocabulary maps words to int32 term IDs
+    and every matrix reuses the same CSR index arrays (each row's sorted
+    term IDs), so keyword, MMR and BM25 scoring share one token index.
+    """
+    global _term_key, _term_vectorizer, _chunk_term_matrix, _chunk_bm25_matrix, _chunk_bitsets
+    key = _chunks_key(chunks)
+    if _term_key == key:
+        return
+    
+    # Not valid for any chunk list until rebuilt below
+    _term_key = None
+    _chunk_bitsets = None
+    
+    from sklearn.feature_extraction.text import CountVectorizer
+    
+    # Same tokens as query.lower().split(), so scores equal word-set overlaps
+    _term_vectorizer = CountVectorizer(
+        lowercase=True, tokenizer=str.split, token_pattern=None, dtype=np.int32
+    )
+    try:
+        term_counts = _term_vectorizer.fit_transform(chunks).tocsr()
+    except ValueError:
+        # No chunk contains any word
+        _term_vectorizer = None
+        _chunk_term_matrix = None
+        _chunk_bm25_matrix = None
+        _term_key = key
+        return
+    
+    term_counts.sort_indices()
+    _chunk_term_matrix = _with_data(term_counts, np.ones_like(term_counts.data))
+    _chunk_bm25_matrix = _bm25_weights(term_counts, _chunk_term_matrix)
+    
+    # np.bitwise_count needs NumPy >= 2.0
+    if _chunk_term_matrix.shape[1] <= _BITSET_MAX_VOCAB and hasattr(np, 'bitwise_count'):
+        _chunk_bitsets = _pack_bitsets(_chunk_term_matrix)
+    _term_key = key
+
+
+def _with_data(matrix, data):
+    """CSR matrix with new values on matrix's index arrays (shared, not copied)"""
+    from scipy.sparse import csr_matrix
+    
+    return csr_matrix((data, matrix.indices, matrix.indptr), shape=matrix.shape, copy=False)
+
+
+def _bm25_weights(term_counts, term_matrix):
+    """
+    Precompute the BM25 contribution of every (chunk, term) pair
+    
+    Matches rank_bm25's BM25Okapi: negative IDFs are replaced by epsilon times
+    the average IDF. A query's BM25 scores are then this matrix times its term
+    count vector.
+    
+    Args:
+        term_counts: Chunk x term CSR matrix of term frequencies
+        term_matrix: Binary version of term_counts
+        
+    Returns:
+        CSR matrix of BM25 weights with the same sparsity as term_counts
+    """
+    num_chunks = term_counts.shape[0]
+    doc_lens = np.asarray(term_counts.sum(axis=1)).ravel().astype(np.float64)
+    avgdl = doc_lens.mean()
+    
+    doc_freqs = np.asarray(term_matrix.sum(axis=0)).ravel().astype(np.float64)
+    idf = np.log(num_chunks - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+    idf[idf < 0] = _BM25_EPSILON * idf.mean()
+    
+    # Length normalization of the row each stored entry belongs to
+    row_of_entry = np.repeat(np.arange(num_chunks), np.diff(term_counts.indptr))
+    length_norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * doc_lens / avgdl)
+    
+    tf = term_counts.data.astype(np.float64)
+    weights = idf[term_counts.indices] * (tf * (_BM25_K1 + 1)) / (tf + length_norm[row_of_entry])
+    return _with_data(term_counts, weights)
+
+
+def _bm25_scores(chunks: List[str], query: str) -> np.ndarray:
+    """
+    BM25 score of every chunk for the query (repeated query words count again)
+    
+    Args:
+        chunks: List of document chunks
+        query: User query
+        
+    Returns:
+        Float score per chunk
+    """
+    _ensure_term_matrix(chunks)
+    if _chunk_bm25_matrix is None:
+        return np.zeros(len(chunks))
+    
+    query_counts = _term_vectorizer.transform([query])
+    return (_chunk_bm25_matrix @ query_counts.T).toarray().ravel()
+
+
+def _pack_bitsets(term_matrix) -> np.ndarray:
+    """Pack each row of a binary chunk-term matrix into uint64 words"""
+    num_words = (term_matrix.shape[1] + 63) // 64
+    dense = np.zeros((term_matrix.shape[0], num_words * 64), dtype=bool)
+    dense[:, :term_matrix.shape[1]] = term_matrix.toarray()
+    packed = np.packbits(dense, axis=1, bitorder='little')
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+def _word_overlaps(chunk_idx: int) -> np.ndarray:
+    """
+    Number of distinct words every chunk shares with chunk chunk_idx
+    
+    Small vocabularies use AND + popcount over packed bitsets; larger ones
+    use a sparse matrix-vector product.
+    """
+    if _chunk_bitsets is not None:
+        return np.bitwise_count(_chunk_bitsets & _chunk_bitsets[chunk_idx]).sum(axis=1)
+    overlaps = _chunk_term_matrix @ _chunk_term_matrix[chunk_idx].T
+    return overlaps.toarray().ravel()
+
+
+def _keyword_scores(chunks: List[str], query: str) -> np.ndarray:
+    """
+    Number of distinct query words found in each chunk
+    
+    Args:
+        chunks: List of document chunks
+        query: User query
+        
+    Returns:
+        Integer score per chunk
+    """
+    _ensure_term_matrix(chunks)
+    if _chunk_term_matrix is None:
+        return np.zeros(len(chunks), dtype=np.int64)
+    
+    query_vector = _term_vectorizer.transform([query])
+    query_vector.data[:] = 1
+    return (_chunk_term_matrix @ query_vector.T).toarray().ravel()
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first
+    
+    Uses a linear-time partition instead of a full sort. Ties are broken by
+    position, matching a stable descending sort.
+    
+    Args:
+        scores: Score per chunk
+        k: Number of indices to return
+        
+    Returns:
+        Array of up to k indices
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k >= n:
+        return np.argsort(-scores, kind='stable')
+    
+    # Everything strictly above the k-th best score is in; fill the rest
+    # with the earliest chunks that tie with it
+    kth_score = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    above = np.flatnonzero(scores > kth_score)
+    ties = np.flatnonzero(scores == kth_score)[:k - len(above)]
+    top = np.concatenate((above, ties))
+    return top[np.lexsort((top, -scores[top]))]
+
+
+def _cosine_scores(query_embedding: np.ndarray, embeddings, embeddings_i8=None) -> np.ndarray:
+    """
+    Cosine similarity between the query and every chunk embedding
+    
+    Args:
+        query_embedding: Unit-norm query embedding
+        embeddings: Unit-norm chunk embeddings
+        embeddings_i8: int8 copy of embeddings for SimSIMD, or None
+        
+    Returns:
+        Array of similarities, one per chunk
+    """
+    if _on_gpu(embeddings):
+        return _gpu_cosine_scores(query_embedding, embeddings).cpu().numpy()
+    
+    query = np.asarray(query_embedding, dtype=np.float32)
+    
+    if simsimd is not None and embeddings_i8 is not None:
+        # int8 rows are a quarter of the float32 bandwidth; SimSIMD's i8
+        # cosine kernel uses VNNI dot products where the CPU has them
+        query_i8 = _quantize_i8(query[None, :])
+        distances = np.asarray(simsimd.cdist(query_i8, embeddings_i8, metric='cosine'))
+        return 1.0 - distances[0]
+    
+    # Chunk rows are unit-norm, so cosine similarity is a plain dot product
+    return embeddings @ query
+
+
+def _gpu_cosine_scores(query_embedding: np.ndarray, embeddings):
+    """Cosine similarity against GPU chunk embeddings, as a GPU tensor"""
+    import torch
+    
+    query = torch.as_tensor(query_embedding, dtype=embeddings.dtype, device=embeddings.device)
+    return embeddings @ query
+
+
+def _semantic_top_k_indices(query_embedding: np.ndarray, embeddings, embeddings_i8, k: int) -> np.ndarray:
+    """
+    Indices of the k chunks most similar to the query, best first
+    
+    On the GPU, the k best are picked with torch.topk on the device so only
+    k indices are copied back to the host.
+    
+    Args:
+        query_embedding: Unit-norm query embedding
+        embeddings: Unit-norm chunk embeddings
+        embeddings_i8: int8 copy of embeddings for SimSIMD, or None
+        k: Number of indices to return
+        
+    Returns:
+        Array of up to k indices
+    """
+    if not _on_gpu(embeddings):
+        return _top_k_indices(_cosine_scores(query_embedding, embeddings, embeddings_i8), k)
+    
+    import torch
+    
+    scores = _gpu_cosine_scores(query_embedding, embeddings)
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    return torch.topk(scores, k).indices.cpu().numpy()
 
 
 def retrieve_top_k(chunks: List[str], query: str, k: int = 3) -> str:
@@ -55,18 +391,18 @@ def retrieve_top_k(chunks: List[str], query: str, k: int = 3) -> str:
     Returns:
         Combined context string
     """
-    scored_chunks = []
-    query_words = set(query.lower().split())
+    # Nothing to rank: skip building the term index
+    if k <= 0 or not chunks:
+        return ""
+    if len(chunks) == 1:
+        return chunks[0]
     
-    for chunk in chunks:
-        chunk_words = set(chunk.lower().split())
-        # Calculate overlap score
-        score = len(query_words.intersection(chunk_words))
-        scored_chunks.append((chunk, score))
+    # Calculate overlap scores (sparse chunk-term matrix times query vector)
+    # k >= len(chunks) still ranks, since the chunks are returned best first
+    scores = _keyword_scores(chunks, query)
     
-    # Sort by score (descending) and get top k
-    scored_chunks.sort(key=lambda x: x[1], reverse=True)
-    top_chunks = [chunk for chunk, score in scored_chunks[:k]]
+    # Select top k by score (descending)
+    top_chunks = [chunks[i] for i in _top_k_indices(scores, k)]
     
     return '\n---\n'.join(top_chunks)
 
@@ -90,30 +426,18 @@ def retrieve_semantic(chunks: List[str], query: str, k: int = 3) -> str:
         Combined context string from top-k semantically similar chunks
     """
     try:
-        from sentence_transformers import SentenceTransformer
-        from sklearn.metrics.pairwise import cosine_similarity
-        
-        # Load model (cached after first use)
-        global _embedding_model, _chunk_embeddings
-        
-        if _embedding_model is None:
-            _embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Load shared model (cached after first use)
+        get_model()
         
         # Generate chunk embeddings (cache them for efficiency)
-        if _chunk_embeddings is None or len(_chunk_embeddings) != len(chunks):
-            _chunk_embeddings = _embedding_model.encode(chunks)
+        embeddings, embeddings_i8 = _ensure_chunk_embeddings(chunks)
         
         # Generate query embedding
-        query_embedding = _embedding_model.encode([query])[0]
+        query_embedding = encode_query(query)
         
-        # Calculate cosine similarity between query and all chunks
-        similarities = cosine_similarity(
-            query_embedding.reshape(1, -1),
-            _chunk_embeddings
-        )[0]
-        
-        # Get top-k indices
-        top_k_indices = np.argsort(similarities)[-k:][::-1]
+        # Calculate cosine similarity between query and all chunks and get
+        # the top-k indices
+        top_k_indices = _semantic_top_k_indices(query_embedding, embeddings, embeddings_i8, k)
         
         # Get top-k chunks
         top_chunks = [chunks[i] for i in top_k_indices]
@@ -148,47 +472,34 @@ def retrieve_hybrid(chunks: List[str], query: str, k: int = 3, alpha: float = 0.
         Combined context string from top-k hybrid-scored chunks
     """
     try:
-        from sentence_transformers import SentenceTransformer
-        from sklearn.metrics.pairwise import cosine_similarity
-        from rank_bm25 import BM25Okapi
-        
-        # Load embedding model
-        global _embedding_model, _chunk_embeddings, _bm25_index
-        
-        if _embedding_model is None:
-            _embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Load shared embedding model
+        get_model()
         
         # Generate/cache chunk embeddings
-        if _chunk_embeddings is None or len(_chunk_embeddings) != len(chunks):
-            _chunk_embeddings = _embedding_model.encode(chunks)
-        
-        # Build/cache BM25 index
-        if _bm25_index is None or len(_bm25_index.doc_freqs) != len(chunks):
-            tokenized_chunks = [chunk.lower().split() for chunk in chunks]
-            _bm25_index = BM25Okapi(tokenized_chunks)
+        embeddings, embeddings_i8 = _ensure_chunk_embeddings(chunks)
         
         # 1. Get semantic scores
-        query_embedding = _embedding_model.encode([query])[0]
-        semantic_scores = cosine_similarity(
-            query_embedding.reshape(1, -1),
-            _chunk_embeddings
-        )[0]
+        query_embedding = encode_query(query)
+        semantic_scores = _cosine_scores(query_embedding, embeddings, embeddings_i8)
         
-        # Normalize semantic scores to [0, 1]
-        semantic_scores = (semantic_scores - semantic_scores.min()) / (semantic_scores.max() - semantic_scores.min() + 1e-10)
+        # Map semantic scores to [0, 1]: embeddings are unit-norm, so cosine
+        # similarity already lies in [-1, 1] and no min/max scan is needed
+        semantic_scores += 1.0
+        semantic_scores *= 0.5
         
-        # 2. Get BM25 scores
-        tokenized_query = query.lower().split()
-        bm25_scores = _bm25_index.get_scores(tokenized_query)
+        # 2. Get BM25 scores (sparse BM25 weight matrix times query term counts)
+        bm25_scores = _bm25_scores(chunks, query)
         
-        # Normalize BM25 scores to [0, 1]
-        bm25_scores = (bm25_scores - bm25_scores.min()) / (bm25_scores.max() - bm25_scores.min() + 1e-10)
+        # Normalize BM25 scores to [0, 1] in place (after subtracting the
+        # minimum, the maximum is the range)
+        np.subtract(bm25_scores, bm25_scores.min(), out=bm25_scores)
+        np.divide(bm25_scores, bm25_scores.max() + 1e-10, out=bm25_scores)
         
         # 3. Combine scores
         hybrid_scores = alpha * semantic_scores + (1 - alpha) * bm25_scores
         
         # 4. Get top-k indices
-        top_k_indices = np.argsort(hybrid_scores)[-k:][::-1]
+        top_k_indices = _top_k_indices(hybrid_scores, k)
         
         # 5. Get top-k chunks
         top_chunks = [chunks[i] for i in top_k_indices]
@@ -222,47 +533,46 @@ def retrieve_mmr(chunks: List[str], query: str, k: int = 3, lambda_param: float
     if not chunks:
         return ""
     
-    query_words = set(query.lower().split())
-    selected = []
-    remaining = list(chunks)
-    
     # Calculate initial relevance scores
-    relevance_scores = []
-    for chunk in remaining:
-        chunk_words = set(chunk.lower().split())
-        score = len(query_words.intersection(chunk_words))
-        relevance_scores.append(score)
+    relevance_scores = _keyword_scores(chunks, query).astype(np.float64)
+    
+    # With a single pick there is nothing to diversify against: MMR is
+    # just the most relevant chunk
+    if k <= 1 or len(chunks) == 1:
+        return chunks[int(np.argmax(relevance_scores))]
+    
+    # Number of distinct words per chunk (at least 1, to avoid dividing by 0)
+    if _chunk_term_matrix is not None:
+        num_words = np.maximum(_chunk_term_matrix.getnnz(axis=1), 1)
+    else:
+        num_words = np.ones(len(chunks), dtype=np.int64)
     
     # Select first chunk (highest relevance)
-    first_idx = relevance_scores.index(max(relevance_scores))
-    selected.append(remaining.pop(first_idx))
-    relevance_scores.pop(first_idx)
+    first_idx = int(np.argmax(relevance_scores))
+    selected = [first_idx]
+    is_selected = np.zeros(len(chunks), dtype=bool)
+    is_selected[first_idx] = True
+    
+    # Max similarity of every chunk to the selected ones, updated as we go
+    max_similarity = np.zeros(len(chunks))
     
     # Select remaining chunks balancing relevance and diversity
-    while len(selected) < k and remaining:
-        mmr_scores = []
-        
-        for i, chunk in enumerate(remaining):
-            relevance = relevance_scores[i]
-            
-            # Calculate max similarity to already selected chunks
-            max_similarity = 0
-            chunk_words = set(chunk.lower().split())
-            for selected_chunk in selected:
-                selected_words = set(selected_chunk.lower().split())
-                similarity = len(chunk_words.intersection(selected_words)) / max(len(chunk_words), 1)
-                max_similarity = max(max_similarity, similarity)
-            
-            # MMR score
-            mmr = lambda_param * relevance - (1 - lambda_param) * max_similarity
-            mmr_scores.append(mmr)
+    while len(selected) < k and len(selected) < len(chunks):
+        # Only the newest selection can raise the max
+        if _chunk_term_matrix is not None:
+            similarity = _word_overlaps(selected[-1]) / num_words
+            np.maximum(max_similarity, similarity, out=max_similarity)
+        
+        # MMR score (already selected chunks are excluded)
+        mmr_scores = lambda_param * relevance_scores - (1 - lambda_param) * max_similarity
+        mmr_scores[is_selected] = -np.inf
         
         # Select chunk with highest MMR score
-        best_idx = mmr_scores.index(max(mmr_scores))
-        selected.append(remaining.pop(best_idx))
-        relevance_scores.pop(best_idx)
+        best_idx = int(np.argmax(mmr_scores))
+        selected.append(best_idx)
+        is_selected[best_idx] = True
     
-    return '\n---\n'.join(selected)
+    return '\n---\n'.join(chunks[i] for i in selected)
 
 
 def retrieve_parent_document(chunks: List[str], query: str, k: int = 3) -> str:
@@ -280,22 +590,20 @@ def retrieve_parent_document(chunks: List[str], query: str, k: int = 3) -> str:
     Returns:
         Combined context string with expanded context
     """
+    # Nothing to rank: skip building the term index
+    if k <= 0 or not chunks:
+        return ""
+    if len(chunks) == 1:
+        return chunks[0]
+    
     # For now, use top-k but with larger context window
     # In production, you'd maintain parent-child relationships
-    scored_chunks = []
-    query_words = set(query.lower().split())
+    scores = _keyword_scores(chunks, query)
     
-    for i, chunk in enumerate(chunks):
-        chunk_words = set(chunk.lower().split())
-        score = len(query_words.intersection(chunk_words))
-        scored_chunks.append((i, chunk, score))
-    
-    # Sort by score and get top k
-    scored_chunks.sort(key=lambda x: x[2], reverse=True)
-    
-    # Get expanded context (include neighboring chunks)
+    # Get expanded context (include neighboring chunks) for the top k
     expanded_chunks = []
-    for i, chunk, score in scored_chunks[:k]:
+    for i in _top_k_indices(scores, k):
+        chunk = chunks[i]
         context_parts = []
         # Add previous chunk if exists
         if i > 0:
@@ -311,6 +619,16 @@ def retrieve_parent_document(chunks: List[str], query: str, k: int = 3) -> str:
     return '\n---\n'.join(expanded_chunks)
 
 
+# Retrieval strategy name -> implementation, used by retrieve_chunks
+_STRATEGIES = {
+    'top-k': retrieve_top_k,
+    'semantic': retrieve_semantic,
+    'hybrid': retrieve_hybrid,
+    'mmr': retrieve_mmr,
+    'parent': retrieve_parent_document,
+}
+
+
 def calculate_similarity(text1: str, text2: str) -> float:
     """
     Calculate simple word overlap similarity between two texts
@@ -1,9 +1,28 @@
 """
 Utility functions for document processing
 """
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
 from pypdf import PdfReader
 
+# Runs of whitespace collapsed by clean_text
+_WS_RE = re.compile(r'\s+')
+
+# PDFs with more pages than this are extracted in a process pool (multi-CPU hosts only)
+PARALLEL_PAGE_THRESHOLD = 8
+
+# Worker processes used for large PDFs
+PDF_WORKERS = os.cpu_count() or 1
+
+# Process pool for large PDFs, created on first use and shared across uploads
+_page_executor = None
+_page_executor_lock = threading.Lock()
+
 
 def extract_text_from_pdf(pdf_content: bytes) -> str:
     """
@@ -16,19 +35,88 @@ def extract_text_from_pdf(pdf_content: bytes) -> str:
         Extracted text from the PDF
     """
     try:
-        pdf_file = BytesIO(pdf_content)
-        reader = PdfReader(pdf_file)
+        reader = PdfReader(BytesIO(pdf_content), strict=False)
         
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n\n"
+        num_pages = len(reader.pages)
+        # A single worker gives no parallelism, only process overhead
+        if num_pages > PARALLEL_PAGE_THRESHOLD and PDF_WORKERS > 1:
+            parts = _extract_pages_parallel(reader, pdf_content)
+        else:
+            # Collect page texts and join once instead of growing a string
+            parts = [page.extract_text() or "" for page in reader.pages]
         
-        return text.strip()
+        return "\n\n".join(parts).strip()
         
     except Exception as e:
         raise ValueError(f"Error extracting text from PDF: {str(e)}")
 
 
+def _extract_page_range(pdf_content: bytes, start: int, stop: int) -> list:
+    """Extract the texts of pages [start, stop) in a pool worker"""
+    reader = PdfReader(BytesIO(pdf_content), strict=False)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _get_page_executor() -> ProcessPoolExecutor:
+    """
+    Get the shared PDF extraction pool, creating it on first use
+    
+    Workers are started with forkserver (spawn where unavailable) rather
+    than fork, since callers run in worker threads next to the embedding
+    model's threads and forking a multithreaded process can deadlock.
+    """
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _page_executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=context)
+        return _page_executor
+
+
+def _reset_page_executor(executor: ProcessPoolExecutor):
+    """Drop a broken pool so the next large PDF starts a fresh one"""
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is executor:
+            _page_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_pages_parallel(reader: PdfReader, pdf_content: bytes) -> list:
+    """
+    Extract page texts across processes, in page order
+    
+    pypdf text extraction is pure-Python CPU work and pages are independent,
+    so large PDFs are split into one contiguous page range per worker of a
+    shared process pool. Each task parses the PDF once for its range.
+    
+    Args:
+        reader: Reader already opened on the PDF, used if the pool fails
+        pdf_content: PDF file content as bytes
+        
+    Returns:
+        List of page texts, in page order
+    """
+    num_pages = len(reader.pages)
+    num_tasks = min(PDF_WORKERS, num_pages)
+    bounds = [num_pages * i // num_tasks for i in range(num_tasks + 1)]
+    executor = None
+    try:
+        # Starting the pool can fail too (e.g. no sem_open in a sandbox)
+        executor = _get_page_executor()
+        futures = [
+            executor.submit(_extract_page_range, pdf_content, start, stop)
+            for start, stop in zip(bounds, bounds[1:])
+        ]
+        return [text for future in futures for text in future.result()]
+    except Exception as e:
+        print(f"Warning: Parallel PDF extraction failed ({e}). Extracting pages serially.")
+        if executor is not None and isinstance(e, BrokenProcessPool):
+            _reset_page_executor(executor)
+        return [page.extract_text() or "" for page in reader.pages]
+
+
 def clean_text(text: str) -> str:
     """
     Clean and normalize text
@@ -40,7 +128,7 @@ def clean_text(text: str) -> str:
         Cleaned text
     """
     # Remove excessive whitespace
-    text = ' '.join(text.split())
+    text = _WS_RE.sub(' ', text).strip()
     
     # Remove special characters if needed
     # text = re.sub(r'[^\w\s.,!?-]', '', text)